@@ -4,8 +4,10 @@
 
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
+import numpy as np
+
+import trainline_charts as charts
+import trainline_events as events
 
 
 #################################
@@ -35,12 +37,6 @@ sidebar_style = """
 """
 st.markdown(sidebar_style, unsafe_allow_html=True)
 
-# Year colour palette
-year_colours = {
-    "2023": "#00a88f",
-    "2024": "#2d00b1"
-}
-
 # Logo
 st.sidebar.image("lookups/trainline_logo.png", width=250)   # logo at top of main page
 st.sidebar.markdown("Aysha Streeter  \nSenior Data Scientist")                  # header text
@@ -50,9 +46,101 @@ st.sidebar.markdown("Aysha Streeter  \nSenior Data Scientist")
 #################################
 # DATA IMPORT
 #################################
-df = pd.read_csv("sales_processed.csv")
+load_sales = st.cache_data(charts.read_sales)
+load_event_calendar = st.cache_data(events.load_event_calendar)
+
+# Years are only a listing of the store, so are read on every run to pick up newly written years
+available_years = charts.read_years()
+year_colours = charts.year_colour_map(available_years)
+
+# Year range dropdown; pushed down into the loader so only the viewed years are read
+if len(available_years) > 1:
+    start_year, end_year = st.sidebar.select_slider(
+        'year(s):', options=available_years, value=(available_years[0], available_years[-1])
+    )
+else:
+    start_year = end_year = available_years[0]
+
+df = load_sales(start_year, end_year)
 df_stations = pd.read_csv("stations.csv")
 
+# Fast preview answers the scorecards, distribution and totals from a sample rather than every row
+fast_preview = st.sidebar.toggle('fast preview (sampled):', value=False)
+
+# Years being viewed; the latest is compared against the one before it where there is one
+selected_years = sorted(df['year'].unique().tolist())
+latest_year = selected_years[-1]
+previous_year = selected_years[-2] if len(selected_years) > 1 else None
+
+
+
+#################################
+# SAMPLING
+#################################
+
+# Strata for the fast preview sample; each station-month keeps a fixed number of rows,
+# so the sample grows with stations and months covered rather than with rows.
+STRATA = ['station', 'year', 'month']
+
+
+@st.cache_data
+def load_sample(start_year, end_year, per_stratum=5, seed=2025):
+    """Stratified sample of up to per_stratum rows per station-month.
+
+    Keeps the number of rows in each stratum, and the weight scaling each sampled row up to
+    them, so means and totals can be estimated from the sample.
+    """
+    df_range = load_sales(start_year, end_year)
+    shuffled = df_range.iloc[np.random.default_rng(seed).permutation(len(df_range))]
+    sample = shuffled[shuffled.groupby(STRATA).cumcount() < per_stratum]
+    stratum_rows = df_range.groupby(STRATA).size().rename('stratum_rows')
+    sample = sample.merge(stratum_rows, left_on=STRATA, right_index=True).sort_values(STRATA + ['date'])
+    sample['weight'] = sample['stratum_rows'] / sample.groupby(STRATA)['sales'].transform('size')
+    return sample
+
+
+def stratified_mean(sample, by):
+    """Estimated mean sales per group in by, with a 95% margin of error.
+
+    Each stratum is weighted by its share of the group's rows; the margin is from the
+    stratified variance with a finite population correction.
+    """
+    keys = list(dict.fromkeys(by + STRATA))
+    strata = sample.groupby(keys).agg(
+        mean=('sales', 'mean'), var=('sales', 'var'), n=('sales', 'size'), rows=('stratum_rows', 'first')
+    )
+    share = strata['rows'] / strata.groupby(level=by)['rows'].transform('sum')
+    strata['est'] = share * strata['mean']
+    strata['est_var'] = share ** 2 * (1 - strata['n'] / strata['rows']) * strata['var'].fillna(0) / strata['n']
+    estimates = strata.groupby(level=by)[['est', 'est_var']].sum()
+    return pd.DataFrame({'mean': estimates['est'], 'margin': 1.96 * np.sqrt(estimates['est_var'])})
+
+
+def median_bounds(sales):
+    """Median of sampled sales, with a 95% interval from the order statistics either side of it."""
+    values = np.sort(sales.to_numpy())
+    n = len(values)
+    half_width = 1.96 * np.sqrt(n) / 2
+    return pd.Series({
+        'median': np.median(values),
+        'lower': values[max(int(np.floor(n / 2 - half_width)), 0)],
+        'upper': values[min(int(np.ceil(n / 2 + half_width)), n - 1)]
+    })
+
+
+# Frame the totals charts no finer than the sample's strata are summed from (operator share,
+# monthly sales over time and rurality). In fast preview, each sampled row's sales are scaled up by
+# its weight, so sums over the sample estimate the totals over every row. Charts by day or week
+# would split a station-month's few sampled rows, so are always summed from every row.
+if fast_preview:
+    df_sample = load_sample(start_year, end_year)
+    df_totals = df_sample.assign(sales=df_sample['sales'] * df_sample['weight'])
+    st.sidebar.markdown(
+        f"preview from {len(df_sample):,} of {len(df):,} rows ({len(df_sample) / len(df):.0%})"
+    )
+else:
+    df_totals = df
+
 
 
 #################################
@@ -66,24 +154,7 @@ left_col, mid_col, right_col = st.columns([1,1,1])
 # MAP
 #################################
 with left_col:
-    fig_map = px.scatter_mapbox(
-        df.drop_duplicates(subset=['station']), 
-        lat="lat",
-        lon="lon",
-        hover_name='station',
-        hover_data=['region_nm', 'operator'],
-        zoom=5,
-        color='region_nm',
-        height=750,
-        width=450
-    )
-    fig_map.update_layout(
-        mapbox_style="carto-positron",
-        mapbox_center={"lat": 54.5, "lon": -3.0},
-        mapbox_zoom=4.75,
-        showlegend=False  
-    )
-    st.plotly_chart(fig_map, use_container_width=False)
+    st.plotly_chart(charts.map_figure(df), use_container_width=False)
 
 
 
@@ -91,28 +162,35 @@ with left_col:
 # SCORECARDS
 #################################
 
-# Filtering by year
-df_2023 = df[df['year'] == 2023]
-df_2024 = df[df['year'] == 2024]
-
-# Averaging
-daily_avg_2023 = df_2023.groupby('date')['sales'].mean().reset_index()
-daily_avg_2024 = df_2024.groupby('date')['sales'].mean().reset_index()
-
-# Overall averaging and standard deviations
-overall_avg_2023 = daily_avg_2023['sales'].mean()
-overall_std_2023 = daily_avg_2023['sales'].std()
-
-overall_avg_2024 = daily_avg_2024['sales'].mean()
-overall_std_2024 = daily_avg_2024['sales'].std()
+# Averaging across stations per day, then across days per year.
+# In fast preview, estimated from the sample with a margin of error in place of the std.
+if fast_preview:
+    yearly_stats = stratified_mean(df_sample, ['year'])
+    spread, spread_label = 'margin', ' 95% MoE'
+else:
+    daily_avg = df.groupby(['year', 'date'])['sales'].mean().reset_index()
+    yearly_stats = daily_avg.groupby('year')['sales'].agg(['mean', 'std'])
+    spread, spread_label = 'std', ''
 
-# Percentage change
-pct_change = ((overall_avg_2024 - overall_avg_2023) / overall_avg_2023) * 100
+# Percentage change against the previous year, where one is being viewed
+if previous_year is not None:
+    pct_change = (
+        (yearly_stats.loc[latest_year, 'mean'] - yearly_stats.loc[previous_year, 'mean'])
+        / yearly_stats.loc[previous_year, 'mean']
+    ) * 100
 
 # Station level averages
-station_avg_2024 = df_2024.groupby('station')['sales'].mean().reset_index()
-max_station_2024 = station_avg_2024.loc[station_avg_2024['sales'].idxmax()]
-min_station_2024 = station_avg_2024.loc[station_avg_2024['sales'].idxmin()]
+if fast_preview:
+    station_avg_latest = (
+        stratified_mean(df_sample[df_sample['year'] == latest_year], ['station'])['mean']
+        .rename('sales')
+        .reset_index()
+    )
+else:
+    df_latest = df[df['year'] == latest_year]
+    station_avg_latest = df_latest.groupby('station')['sales'].mean().reset_index()
+max_station_latest = station_avg_latest.loc[station_avg_latest['sales'].idxmax()]
+min_station_latest = station_avg_latest.loc[station_avg_latest['sales'].idxmin()]
 
 # Staion coverage
 unique_df_stations = df['station'].nunique()
@@ -122,43 +200,39 @@ station_pct = (unique_df_stations / unique_all_stations) * 100
 with mid_col:
     st.markdown("<div style='margin-top:60px'></div>", unsafe_allow_html=True)
 
-    # 2024 mean + std
-    st.markdown(f"<h4 style='text-align:left;'>mean daily sales for all (2024):</h4>", unsafe_allow_html=True)
-    st.markdown(
-        f"<p style='text-align:left; font-size:2.2rem; font-weight:bold;'>"
-        f"£{overall_avg_2024:,.2f} (±£{overall_std_2024:,.2f})</p>",
-        unsafe_allow_html=True
-    )
-
-    # 2023 mean + std
-    st.markdown(f"<h4 style='text-align:left;'>mean daily sales for all (2023):</h4>", unsafe_allow_html=True)
-    st.markdown(
-        f"<p style='text-align:left; font-size:2.2rem; font-weight:bold;'>"
-        f"£{overall_avg_2023:,.2f} (±£{overall_std_2023:,.2f})</p>",
-        unsafe_allow_html=True
-    )
+    # Mean + std (or margin of error in fast preview) for the latest and previous years
+    for year in [latest_year, previous_year]:
+        if year is None:
+            continue
+        st.markdown(f"<h4 style='text-align:left;'>mean daily sales for all ({year}):</h4>", unsafe_allow_html=True)
+        st.markdown(
+            f"<p style='text-align:left; font-size:2.2rem; font-weight:bold;'>"
+            f"£{yearly_stats.loc[year, 'mean']:,.2f} (±£{yearly_stats.loc[year, spread]:,.2f}{spread_label})</p>",
+            unsafe_allow_html=True
+        )
 
     # Color-coded % change
-    color = "green" if pct_change >= 0 else "red"
-    st.markdown(f"<h4 style='text-align:left;'>% change</h4>", unsafe_allow_html=True)
-    st.markdown(
-        f"<p style='text-align:left; font-size:2.2rem; font-weight:bold; color:{color};'>{pct_change:.2f}%</p>",
-        unsafe_allow_html=True
-    )
+    if previous_year is not None:
+        color = "green" if pct_change >= 0 else "red"
+        st.markdown(f"<h4 style='text-align:left;'>% change ({latest_year} vs {previous_year})</h4>", unsafe_allow_html=True)
+        st.markdown(
+            f"<p style='text-align:left; font-size:2.2rem; font-weight:bold; color:{color};'>{pct_change:.2f}%</p>",
+            unsafe_allow_html=True
+        )
 
-    # Max station (2024)
-    st.markdown(f"<h4 style='text-align:left;'>station with max daily mean: (2024):</h4>", unsafe_allow_html=True)
+    # Max station (latest year)
+    st.markdown(f"<h4 style='text-align:left;'>station with max daily mean: ({latest_year}):</h4>", unsafe_allow_html=True)
     st.markdown(
         f"<p style='text-align:left; font-size:2.2rem; font-weight:bold;'>"
-        f"{max_station_2024['station']} (£{max_station_2024['sales']:,.2f})</p>",
+        f"{max_station_latest['station']} (£{max_station_latest['sales']:,.2f})</p>",
         unsafe_allow_html=True
     )
 
-    # Min station (2024)
-    st.markdown(f"<h4 style='text-align:left;'>station with min daily mean (2024):</h4>", unsafe_allow_html=True)
+    # Min station (latest year)
+    st.markdown(f"<h4 style='text-align:left;'>station with min daily mean ({latest_year}):</h4>", unsafe_allow_html=True)
     st.markdown(
         f"<p style='text-align:left; font-size:2.2rem; font-weight:bold;'>"
-        f"{min_station_2024['station']} (£{min_station_2024['sales']:,.2f})</p>",
+        f"{min_station_latest['station']} (£{min_station_latest['sales']:,.2f})</p>",
         unsafe_allow_html=True
     )
 
@@ -169,44 +243,7 @@ with right_col:
 # OPERATOR SHARE
 #################################
 
-    operator_sales_2023 = df_2023.groupby('operator')['sales'].sum().reset_index()
-    operator_sales_2024 = df_2024.groupby('operator')['sales'].sum().reset_index()
-
-    operator_sales_2023['proportion'] = operator_sales_2023['sales'] / operator_sales_2023['sales'].sum() * 100
-    operator_sales_2024['proportion'] = operator_sales_2024['sales'] / operator_sales_2024['sales'].sum() * 100
-
-    operator_sales_2023['year'] = "2023"
-    operator_sales_2024['year'] = "2024"
-    operator_sales = pd.concat([operator_sales_2023, operator_sales_2024], ignore_index=True)
-
-    custom_colours = ["#00a88f", "#2d00b1", "#f4a300"]
-    fig_bar = px.bar(
-        operator_sales,
-        y="year",             
-        x="proportion",       
-        color='operator',    
-        barmode="stack",
-        orientation="h",      
-        labels={"proportion": "percentage of total sales", "year": "Year"},
-        title="share of sales by operator",
-        color_discrete_sequence=custom_colours
-    )
-
-    fig_bar.update_layout(
-            title=dict(
-        text="share of sales by operator",
-        x=0.5,             
-        y=0.95,           
-        xanchor="center",  
-        yanchor="top"     
-    ),
-        height=300,
-        title_x=0.5, 
-        margin=dict(t=40, b=40),
-        uniformtext_minsize=8,
-        uniformtext_mode='hide'
-    )
-    st.plotly_chart(fig_bar, use_container_width=True)
+    st.plotly_chart(charts.operator_share_figure(df_totals, selected_years), use_container_width=True)
 
     # Adding spacing to separate plots.
     st.markdown("<div style='margin-top:50px'></div>", unsafe_allow_html=True)
@@ -217,27 +254,7 @@ with right_col:
 # GAUGE 
 #################################
 
-    fig_gauge = go.Figure(go.Indicator(
-        mode="gauge+number",
-        value=station_pct,
-        title={'text': "station data coverage (%)", 'font': {'size': 16}}, 
-        gauge={
-            'axis': {'range': [0, 100]},
-            'bar': {'color': "teal"},  
-            'bgcolor': "white",
-            'steps': [],               
-            'threshold': {
-                'line': {'color': "teal", 'width': 3},
-                'thickness': 0.75,
-                'value': station_pct
-            }
-        }
-    ))
-    fig_gauge.update_layout(
-        height=175,                    
-        margin=dict(t=40, b=20)       
-    )
-    st.plotly_chart(fig_gauge, use_container_width=True)
+    st.plotly_chart(charts.coverage_gauge_figure(station_pct), use_container_width=True)
         
 
 
@@ -313,67 +330,14 @@ if selected_operator:
 #################################
 # SALES BY DAY
 #################################
-        sales_by_day = filtered_df.groupby(["year", "month_day"])["sales"].sum().reset_index()
-        sales_by_day["dummy_date"] = pd.to_datetime("2000-" + sales_by_day["month_day"], format="%Y-%m-%d")
-
-        # Convert year to string so it matches year_colors keys
-        sales_by_day["year"] = sales_by_day["year"].astype(str)
-
-        chart_title = (
-            f"Total sales by day and year <br>"
-            f"operator: {selected_operator} | regions: {region_label} | stations: {station_label}"
-        )
-
-        year_colors = {
-            "2023": "#00a88f",  # teal
-            "2024": "#2d00b1"   # purple
-        }
-
-        fig = px.line(
-            sales_by_day,
-            x="dummy_date",
-            y="sales",
-            color="year",
-            title=chart_title,
-            labels={"dummy_date": "date", "sales": "total sales gbp"},
-            color_discrete_map=year_colors  # apply custom colors
-        )
-
-        fig.update_layout(
-            height=600,
-            margin=dict(l=40, r=40, t=80, b=40),
-            title_x=0.5,
-            title_font=dict(size=20),
-            title=dict(x=0.5, xanchor="center", yanchor="top")
-        )
-
-        fig.update_yaxes(title_text="total sales gbp")
-
-        fig.update_xaxes(
-            tickangle=-45,
-            rangeslider_visible=True,
-            tickformatstops=[
-                dict(dtickrange=[None, "M1"], value="%b-%d"),
-                dict(dtickrange=["M1", None], value="%b"),
-            ],
-        )
-
-        fig.update_traces(
-            customdata=sales_by_day["year"], 
-            hovertemplate="day: %{x|%b-%d}<br>year: %{customdata}<br>sales: %{y}<extra></extra>"
+        if fast_preview:
+            st.caption(
+                "fast preview: sales over time (monthly), rurality and operator share are estimated "
+                "from the sample; charts by day and week are exact"
             )
 
-        for day in sales_by_day["dummy_date"].unique():
-            if day.weekday() >= 5:
-                fig.add_vrect(
-                    x0=day,
-                    x1=day + pd.Timedelta(days=1),
-                    fillcolor="lightgrey",
-                    opacity=0.2,
-                    layer="below",
-                    line_width=0,
-                )
-
+        sales_by_day = charts.aggregate(filtered_df, "sales_by_day")
+        fig = charts.sales_by_day_figure(sales_by_day, year_colours, selected_operator, region_label, station_label)
         st.plotly_chart(fig, use_container_width=True)
 
 
@@ -382,53 +346,26 @@ if selected_operator:
 # SALES BY STATION AND TIME
 #################################
 
-        if "date" not in filtered_df.columns:
-            filtered_df["date"] = pd.to_datetime(
-                filtered_df["year"].astype(str) + "-" + filtered_df["month_day"], format="%Y-%m-%d"
-            )
-
-        mask = (filtered_df["date"] >= "2023-01-01") & (filtered_df["date"] <= "2024-12-01")
-        time_filtered_df = filtered_df.loc[mask]
-
-        sales_over_time = (
-            time_filtered_df.groupby(["date", 'station'])["sales"].sum().reset_index()
-        )
-
-        chart_title2 = (
-            f"Total sales over time by station(s)<br>"
-            f"operator: {selected_operator} | region(s): {region_label} | station(s): {station_label}"
-        )
-
-        fig2 = px.line(
-            sales_over_time,
-            x="date",
-            y="sales",
-            color='station',
-            title=chart_title2,
-            labels={"date": "date", "sales": "total sales gbp", 'station': 'station'},
-            hover_data={'station': True}
-        )
+        # Year range is already applied by the loader
+        time_filtered_df = filtered_df
 
-        fig2.update_layout(
-            height=600,
-            margin=dict(l=40, r=40, t=80, b=40),
-            title_x=0.5,
-            title_font=dict(size=20),
-            title=dict(x=0.5, xanchor="center", yanchor="top")
-        )
-
-        fig2.update_yaxes(title_text="total sales gbp")
+        # The sample is drawn per station-month, so in fast preview totals over time are by month
+        if fast_preview:
+            sampled_df = df_totals[df_totals['station'].isin(time_filtered_df['station'].unique())]
+            sales_over_time = charts.aggregate(
+                sampled_df.assign(date=sampled_df["date"].dt.to_period("M").dt.to_timestamp()),
+                "sales_over_time"
+            )
+        else:
+            sales_over_time = charts.aggregate(time_filtered_df, "sales_over_time")
 
-        fig2.update_xaxes(
-            tickangle=-45,
-            rangeslider_visible=True,
-            tickformat="%b %Y"
+        # Strikes and the bank holidays of the selected regions, shaded behind the lines
+        event_periods = events.event_periods(
+            load_event_calendar(), filtered_regions, sales_over_time["date"].min(), sales_over_time["date"].max()
         )
-
-        fig2.update_traces(
-            hovertemplate="station: %{customdata[0]}<br>date: %{x|%b-%d-%Y}<br>sales: %{y}<extra></extra>"
+        fig2 = charts.sales_over_time_figure(
+            sales_over_time, selected_operator, region_label, station_label, events=event_periods
         )
-
         st.plotly_chart(fig2, use_container_width=True)
 
 else:
@@ -440,55 +377,18 @@ else:
 # DISTRIBUTION
 #################################
 
-fig3 = go.Figure()
-
-year_colors = {
-    2024: "#2d00b1",
-    2023: "#00a88f"
-}
-
-for year in [2023, 2024]:
-    year_data = time_filtered_df[time_filtered_df["year"] == year]
-    fig3.add_trace(
-        go.Box(
-            x=year_data["month"],         
-            y=year_data["sales"],
-            name=str(year),               
-            boxpoints="all",
-            hovertext=year_data['station'],
-            marker=dict(opacity=0.6, color=year_colors[year]),
-        )
-    )
-
-chart_title3 = (
-    f"Sales distribution by month<br>"
-    f"operator: {selected_operator} | region(s): {region_label} | station(s): {station_label}"
-)
+# In fast preview, boxes are drawn from the sampled rows for the selected stations,
+# with the median's 95% interval overlaid.
+if fast_preview:
+    distribution_df = df_sample[df_sample['station'].isin(time_filtered_df['station'].unique())]
+    medians = distribution_df.groupby(['year', 'month'])['sales'].apply(median_bounds).unstack().reset_index()
+else:
+    distribution_df = time_filtered_df
+    medians = None
 
-fig3.update_layout(
-    width=1200,
-    height=700,
-    title=dict(
-        text=chart_title3,
-        x=0.5,
-        xanchor="center",
-        yanchor="top"
-    ),
-    title_font=dict(size=20),
-    xaxis_title="month",
-    yaxis_title="sales gbp",
-    template="plotly_white",
-    showlegend=True, 
-    xaxis=dict(
-        tickmode="array",
-        tickvals=list(range(1, 13)), 
-        ticktext=[str(m) for m in range(1, 13)],
-        categoryorder="array",
-        categoryarray=list(range(1, 13))
-    ),
-    boxmode="group"
+fig3 = charts.distribution_figure(
+    distribution_df, selected_years, year_colours, selected_operator, region_label, station_label, medians=medians
 )
-
 st.plotly_chart(fig3, use_container_width=True)
 
 
@@ -497,66 +397,8 @@ st.plotly_chart(fig3, use_container_width=True)
 # DISTRIBUTION
 #################################
 
-# Ensuring date column exists
-if "date" not in time_filtered_df.columns:
-    time_filtered_df["date"] = pd.to_datetime(
-        time_filtered_df["year"].astype(str) + "-" + time_filtered_df["month_day"],
-        format="%Y-%m-%d"
-    )
-
-# Aggregating sales
-agg = (
-    time_filtered_df.groupby(["month", "week_day"])["sales"]
-    .sum()
-    .reset_index()
-)
-
-# Converting to percentages within each month
-agg["pct"] = agg.groupby("month")["sales"].transform(lambda x: x / x.sum() * 100)
-
-# Setting axis names
-weekday_order = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
-
-fig = go.Figure()
-for wd in weekday_order:
-    wd_data = agg[agg["week_day"] == wd]
-    fig.add_trace(
-        go.Bar(
-            x=wd_data["month"],
-            y=wd_data["pct"],
-            name=wd.capitalize(),  # capitalize for nicer legend labels
-            text=wd_data["pct"].round(1).astype(str) + "%",
-            textposition="inside"
-        )
-    )
-
-#  Chart title
-chart_title = (
-    f"Sales distribution by weekday percentages per month<br>"
-    f"operator: {selected_operator} | region(s): {region_label} | station(s): {station_label}"
-)
-
-fig.update_layout(
-    barmode="stack",
-    width=1200,
-    height=700,
-    title=dict(
-        text=chart_title,
-        x=0.5,
-        xanchor="center",
-        yanchor="top"
-    ),
-    title_font=dict(size=20),
-    xaxis=dict(
-        tickmode="array",
-        tickvals=list(range(1, 13)),
-        ticktext=[str(m) for m in range(1, 13)],
-        title="month"
-    ),
-    yaxis=dict(title="Sales (%)"),
-    template="plotly_white"
-)
-
+weekday_sales = charts.aggregate(time_filtered_df, "weekday_share")
+fig = charts.weekday_share_figure(weekday_sales, selected_operator, region_label, station_label)
 st.plotly_chart(fig, use_container_width=True)
 
 
@@ -565,77 +407,14 @@ st.plotly_chart(fig, use_container_width=True)
 # CHANGE
 #################################
 
-# Ensuring date column exists
-if "date" not in time_filtered_df.columns:
-    time_filtered_df["date"] = pd.to_datetime(
-        time_filtered_df["year"].astype(str) + "-" + time_filtered_df["month_day"],
-        format="%Y-%m-%d"
+if previous_year is None:
+    st.info("select more than one year to see the change in sales by week")
+else:
+    weekly_sales = charts.aggregate(time_filtered_df, "weekly_change")
+    fig = charts.weekly_change_figure(
+        weekly_sales, latest_year, previous_year, selected_operator, region_label, station_label
     )
-
-# Aggregating sales by (year, week)
-weekly_sales = (
-    time_filtered_df.groupby(["year", "week_number"])["sales"]
-    .sum()
-    .reset_index()
-)
-
-# Pivoting for 2023 and 2024
-pivot = weekly_sales.pivot(index="week_number", columns="year", values="sales")
-
-# Ensuring all weeks 1–52 are present
-pivot = pivot.reindex(range(1, 53), fill_value=0)
-
-# Calculating percentage change.
-# Avoiding division by zero by replacing 0 with NaN, then filling with 0
-pivot["pct_change"] = (pivot[2024] - pivot[2023]) / pivot[2023].replace(0, pd.NA) * 100
-pivot["pct_change"] = pivot["pct_change"].fillna(0)
-
-# Building bar chart.
-fig = go.Figure()
-fig.add_trace(
-    go.Bar(
-        x=pivot.index,
-        y=pivot["pct_change"],
-        text=pivot["pct_change"].round(1).astype(str) + "%",
-        textposition="outside",
-        marker=dict(color="#00a88f")
-    )
-)
-
-chart_title = (
-    f"Change in sales by week % (2024 vs 2023)<br>"
-    f"operator: {selected_operator} | region(s): {region_label} | station(s): {station_label}"
-)
-
-fig.update_layout(
-    width=1200,
-    height=700,
-    title=dict(
-        text=chart_title,
-        x=0.5,
-        xanchor="center",
-        yanchor="top"
-    ),
-    title_font=dict(size=20),
-    xaxis=dict(
-        tickmode="array",
-        tickvals=list(range(1, 53)),
-        ticktext=[str(w) for w in range(1, 53)],
-        title="week"
-    ),
-    yaxis=dict(title = 'sales change %'),
-    template="plotly_white",
-    shapes=[  # add a horizontal line at 0%
-        dict(
-            type="line",
-            xref="paper", x0=0, x1=1,
-            yref="y", y0=0, y1=0,
-            line=dict(color="black", dash="dash")
-        )
-    ]
-)
-
-st.plotly_chart(fig, use_container_width=True)
+    st.plotly_chart(fig, use_container_width=True)
 
 
 
@@ -643,12 +422,6 @@ st.plotly_chart(fig, use_container_width=True)
 # COASTAL
 #################################
 
-# Define custom colors
-year_colors = {
-    "2023": "#00a88f",  # teal
-    "2024": "#2d00b1"   # purple
-}
-
 if selected_operator:
     if selected_operator == 'all operators':
         filtered_df = df[(df['region_nm'].isin(filtered_regions)) & (df['station'].isin(filtered_stations))]
@@ -663,38 +436,8 @@ if selected_operator:
         st.info("No data for the selected filters.")
     else:
         # --- Coastal Chart ---
-        weekly_total = filtered_df.groupby(['year','week_number'])['sales'].sum().reset_index(name='total_sales')
-
-        weekly_coastal = (
-            filtered_df[filtered_df['coastal_flag'] == 1]
-            .groupby(['year','week_number'])['sales']
-            .sum()
-            .reset_index(name='coastal_sales')
-        )
-
-        weekly_sales = pd.merge(weekly_total, weekly_coastal, on=['year','week_number'])
-        weekly_sales['coastal_pct'] = (weekly_sales['coastal_sales'] / weekly_sales['total_sales']) * 100
-        weekly_sales['year'] = weekly_sales['year'].astype(str)
-
-        fig_coastal = px.line(
-            weekly_sales,
-            x='week_number',
-            y='coastal_pct',
-            color='year',
-            markers=True,
-            labels={
-                'week_number': 'week',
-                'coastal_pct': 'coastal sales %',
-                'year': 'Year'
-            },
-            title=(
-                f"Sales from coastal stations by week<br>"
-                f"operator: {selected_operator} | regions: {region_label} | stations: {station_label}"
-            ),
-            color_discrete_map=year_colors
-        )
-
-        fig_coastal.update_xaxes(tickmode='linear', tick0=1, dtick=1)
+        coastal_sales = charts.aggregate(filtered_df, "coastal")
+        fig_coastal = charts.coastal_figure(coastal_sales, year_colours, selected_operator, region_label, station_label)
         st.plotly_chart(fig_coastal, use_container_width=True, key="coastal_chart")
 
 
@@ -706,69 +449,20 @@ if selected_operator:
 # Aggregating monthly totals
 if selected_operator:
     if selected_operator == 'all operators':
-        filtered_df = df[
-            (df['region_nm'].isin(filtered_regions)) &
-            (df['station'].isin(filtered_stations))
+        filtered_df = df_totals[
+            (df_totals['region_nm'].isin(filtered_regions)) &
+            (df_totals['station'].isin(filtered_stations))
         ]
     else:
-        filtered_df = df[
-            (df['operator'] == selected_operator) &
-            (df['region_nm'].isin(filtered_regions)) &
-            (df['station'].isin(filtered_stations))
+        filtered_df = df_totals[
+            (df_totals['operator'] == selected_operator) &
+            (df_totals['region_nm'].isin(filtered_regions)) &
+            (df_totals['station'].isin(filtered_stations))
         ]
 
     if filtered_df.empty:
         st.info("no data for the selected filters")
     else:
-
-        monthly_total = (
-            filtered_df.groupby(['month'])['sales']
-            .sum()
-            .reset_index(name='total_sales')
-        )
-
-        monthly_rurality = (
-            filtered_df.groupby(['month','rurality_nm'])['sales']
-            .sum()
-            .reset_index(name='rurality_sales')
-        )
-
-        # Merge totals with rurality breakdown
-        monthly_sales = pd.merge(monthly_total, monthly_rurality, on=['month'], how='inner')
-
-        # Calculate percentage share
-        monthly_sales['rurality_pct'] = (
-            monthly_sales['rurality_sales'] / monthly_sales['total_sales'] * 100
-        )
-
-        # --- Plot ---
-        fig_rurality = px.bar(
-            monthly_sales,
-            x="month",
-            y="rurality_pct",
-            color="rurality_nm",
-            barmode="stack",
-            labels={
-                "month": "Month",
-                "rurality_pct": "Sales share %",
-                "rurality_nm": "Rurality"
-            },
-            title=(
-                f"Sales share by rurality and month<br>"
-                f"operator: {selected_operator} | regions: {region_label} | stations: {station_label}"
-            ),
-            color_discrete_sequence=px.colors.qualitative.Set2
-        )
-
-        fig_rurality.update_layout(
-            barmode="stack",
-            xaxis=dict(
-                tickmode="linear",
-                tick0=1,
-                dtick=1,
-                title="Month"
-            ),
-            yaxis=dict(title="Sales share %")
-        )
-
+        rurality_sales = charts.aggregate(filtered_df, "rurality")
+        fig_rurality = charts.rurality_figure(rurality_sales, selected_operator, region_label, station_label)
         st.plotly_chart(fig_rurality, use_container_width=True, key="rurality_chart")
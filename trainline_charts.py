@@ -0,0 +1,629 @@
+"""Data loading, aggregation and figure building shared by the dashboard and the report export.
+
+Nothing here depends on Streamlit, so figures can be built headless.
+"""
+
+#################################
+# LIBRARIES
+#################################
+
+import os
+import re
+
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+
+
+#################################
+# FORMATTING
+#################################
+
+# Year colour palette, assigned to years in order and cycled if there are more years than colours
+YEAR_PALETTE = ["#00a88f", "#2d00b1", "#f4a300"] + px.colors.qualitative.Set2
+
+# Operator colours
+OPERATOR_COLOURS = ["#00a88f", "#2d00b1", "#f4a300"]
+
+# Event shading colours
+EVENT_COLOURS = {"strike": "#f4a300", "bank holiday": "#2d00b1"}
+
+WEEKDAY_ORDER = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+
+
+def year_colour_map(years):
+    """Colour per year, keyed by the year as a string to match the plotted year columns."""
+    return {str(year): YEAR_PALETTE[i % len(YEAR_PALETTE)] for i, year in enumerate(years)}
+
+
+
+#################################
+# DATA IMPORT
+#################################
+# Processed sales, written by the notebook as one sales_<year>.csv per year
+SALES_PATH = "sales_processed"
+
+SALES_FILE = re.compile(r"sales_(\d{4})\.csv$")
+
+
+def _year_files(path):
+    """{year: file} for the per-year sales files in path."""
+    return {
+        int(match.group(1)): os.path.join(path, name)
+        for name in os.listdir(path)
+        if (match := SALES_FILE.match(name))
+    }
+
+
+def read_years(path=SALES_PATH):
+    """Years present in the processed sales.
+
+    For a directory of per-year files, taken from the file names without reading any data;
+    for a single csv, from its year column.
+    """
+    if os.path.isdir(path):
+        return sorted(_year_files(path))
+    return sorted(pd.read_csv(path, usecols=["year"])["year"].unique().tolist())
+
+
+def read_sales(start_year, end_year, path=SALES_PATH):
+    """Processed sales for start_year to end_year inclusive.
+
+    For a directory of per-year files only the files in range are read, so adding history
+    doesn't grow the cost of reading a range. A single csv is read in full, in chunks so only
+    the rows in range are held in memory, with dates parsed after filtering.
+    """
+    if os.path.isdir(path):
+        frames = [
+            pd.read_csv(file)
+            for year, file in sorted(_year_files(path).items())
+            if start_year <= year <= end_year
+        ]
+    else:
+        frames = [
+            chunk[chunk["year"].between(start_year, end_year)]
+            for chunk in pd.read_csv(path, chunksize=250_000)
+        ]
+    df = pd.concat(frames, ignore_index=True)
+    df["date"] = pd.to_datetime(df["date"])
+    return df
+
+
+
+#################################
+# AGGREGATION
+#################################
+
+# Group keys behind each filtered chart's total sales
+AGGREGATES = {
+    "sales_by_day": ["year", "month_day"],
+    "sales_over_time": ["date", "station"],
+    "weekday_share": ["month", "week_day"],
+    "weekly_change": ["year", "week_number"],
+    "coastal": ["year", "week_number", "coastal_flag"],
+    "rurality": ["month", "rurality_nm"],
+}
+
+
+def aggregate(df, name, by=()):
+    """Total sales for one of the AGGREGATES, kept apart by any extra columns in by.
+
+    Totals are sums, so a result kept apart by e.g. operator and region can be filtered and
+    passed back through aggregate to get the totals for any combination of them.
+    """
+    return df.groupby([*by, *AGGREGATES[name]])["sales"].sum().reset_index()
+
+
+
+#################################
+# NETWORK FIGURES
+#################################
+
+def map_figure(df):
+    """Station locations coloured by region."""
+    fig_map = px.scatter_mapbox(
+        df.drop_duplicates(subset=['station']),
+        lat="lat",
+        lon="lon",
+        hover_name='station',
+        hover_data=['region_nm', 'operator'],
+        zoom=5,
+        color='region_nm',
+        height=750,
+        width=450
+    )
+    fig_map.update_layout(
+        mapbox_style="carto-positron",
+        mapbox_center={"lat": 54.5, "lon": -3.0},
+        mapbox_zoom=4.75,
+        showlegend=False
+    )
+    return fig_map
+
+
+def operator_share_figure(df, years):
+    """Share of each year's sales by operator."""
+    operator_sales = df.groupby(['year', 'operator'])['sales'].sum().reset_index()
+    operator_sales['proportion'] = (
+        operator_sales['sales'] / operator_sales.groupby('year')['sales'].transform('sum') * 100
+    )
+    operator_sales['year'] = operator_sales['year'].astype(str)
+
+    fig_bar = px.bar(
+        operator_sales,
+        y="year",
+        x="proportion",
+        color='operator',
+        barmode="stack",
+        orientation="h",
+        labels={"proportion": "percentage of total sales", "year": "Year"},
+        title="share of sales by operator",
+        color_discrete_sequence=OPERATOR_COLOURS,
+        category_orders={"year": [str(year) for year in years]}
+    )
+
+    fig_bar.update_layout(
+        title=dict(
+            text="share of sales by operator",
+            x=0.5,
+            y=0.95,
+            xanchor="center",
+            yanchor="top"
+        ),
+        height=300,
+        title_x=0.5,
+        margin=dict(t=40, b=40),
+        uniformtext_minsize=8,
+        uniformtext_mode='hide'
+    )
+    return fig_bar
+
+
+def coverage_gauge_figure(station_pct):
+    """Gauge of the percentage of stations with sales data."""
+    fig_gauge = go.Figure(go.Indicator(
+        mode="gauge+number",
+        value=station_pct,
+        title={'text': "station data coverage (%)", 'font': {'size': 16}},
+        gauge={
+            'axis': {'range': [0, 100]},
+            'bar': {'color': "teal"},
+            'bgcolor': "white",
+            'steps': [],
+            'threshold': {
+                'line': {'color': "teal", 'width': 3},
+                'thickness': 0.75,
+                'value': station_pct
+            }
+        }
+    ))
+    fig_gauge.update_layout(
+        height=175,
+        margin=dict(t=40, b=20)
+    )
+    return fig_gauge
+
+
+
+#################################
+# FILTERED FIGURES
+#################################
+
+def sales_by_day_figure(sales_by_day, year_colours, operator, region_label, station_label):
+    """Total sales by day of the year, one line per year, from the sales_by_day aggregate."""
+    sales_by_day = sales_by_day.copy()
+    sales_by_day["dummy_date"] = pd.to_datetime("2000-" + sales_by_day["month_day"], format="%Y-%m-%d")
+
+    # Convert year to string so it matches year_colours keys
+    sales_by_day["year"] = sales_by_day["year"].astype(str)
+
+    chart_title = (
+        f"Total sales by day and year <br>"
+        f"operator: {operator} | regions: {region_label} | stations: {station_label}"
+    )
+
+    fig = px.line(
+        sales_by_day,
+        x="dummy_date",
+        y="sales",
+        color="year",
+        title=chart_title,
+        labels={"dummy_date": "date", "sales": "total sales gbp"},
+        color_discrete_map=year_colours  # apply custom colors
+    )
+
+    fig.update_layout(
+        height=600,
+        margin=dict(l=40, r=40, t=80, b=40),
+        title_x=0.5,
+        title_font=dict(size=20),
+        title=dict(x=0.5, xanchor="center", yanchor="top")
+    )
+
+    fig.update_yaxes(title_text="total sales gbp")
+
+    fig.update_xaxes(
+        tickangle=-45,
+        rangeslider_visible=True,
+        tickformatstops=[
+            dict(dtickrange=[None, "M1"], value="%b-%d"),
+            dict(dtickrange=["M1", None], value="%b"),
+        ],
+    )
+
+    fig.update_traces(
+        customdata=sales_by_day["year"],
+        hovertemplate="day: %{x|%b-%d}<br>year: %{customdata}<br>sales: %{y}<extra></extra>"
+        )
+
+    # Shading weekends; shapes are added in one go as add_vrect per day copies every shape so far
+    fig.update_layout(shapes=[
+        dict(
+            type="rect",
+            xref="x",
+            yref="y domain",
+            x0=day,
+            x1=day + pd.Timedelta(days=1),
+            y0=0,
+            y1=1,
+            fillcolor="lightgrey",
+            opacity=0.2,
+            layer="below",
+            line_width=0,
+        )
+        for day in sales_by_day["dummy_date"].unique()
+        if day.weekday() >= 5
+    ])
+
+    return fig
+
+
+def sales_over_time_figure(sales_over_time, operator, region_label, station_label, events=None):
+    """Total sales over time, one line per station, from the sales_over_time aggregate.
+
+    events, when given, holds event, start and end columns (as from trainline_events.event_periods)
+    for periods to shade behind the lines.
+    """
+    chart_title2 = (
+        f"Total sales over time by station(s)<br>"
+        f"operator: {operator} | region(s): {region_label} | station(s): {station_label}"
+    )
+
+    fig2 = px.line(
+        sales_over_time,
+        x="date",
+        y="sales",
+        color='station',
+        title=chart_title2,
+        labels={"date": "date", "sales": "total sales gbp", 'station': 'station'},
+        hover_data={'station': True}
+    )
+
+    fig2.update_layout(
+        height=600,
+        margin=dict(l=40, r=40, t=80, b=40),
+        title_x=0.5,
+        title_font=dict(size=20),
+        title=dict(x=0.5, xanchor="center", yanchor="top")
+    )
+
+    fig2.update_yaxes(title_text="total sales gbp")
+
+    fig2.update_xaxes(
+        tickangle=-45,
+        rangeslider_visible=True,
+        tickformat="%b %Y"
+    )
+
+    fig2.update_traces(
+        hovertemplate="station: %{customdata[0]}<br>date: %{x|%b-%d-%Y}<br>sales: %{y}<extra></extra>"
+    )
+
+    # Shading strikes and bank holidays, added in one go as for the weekends in sales_by_day_figure
+    if events is not None:
+        fig2.update_layout(shapes=[
+            dict(
+                type="rect",
+                xref="x",
+                yref="y domain",
+                x0=event.start,
+                x1=event.end,
+                y0=0,
+                y1=1,
+                fillcolor=EVENT_COLOURS[event.event],
+                opacity=0.15,
+                layer="below",
+                line_width=0,
+            )
+            for event in events.itertuples()
+        ])
+
+    return fig2
+
+
+def distribution_figure(rows, years, year_colours, operator, region_label, station_label, medians=None):
+    """Box plot of sales rows by month and year.
+
+    medians, when given, holds a sampled median with lower and upper bounds per year and month,
+    drawn as an interval over each box and marking the chart as a fast preview.
+    """
+    fig3 = go.Figure()
+
+    for year in years:
+        year_data = rows[rows["year"] == year]
+        fig3.add_trace(
+            go.Box(
+                x=year_data["month"],
+                y=year_data["sales"],
+                name=str(year),
+                boxpoints="all",
+                hovertext=year_data['station'],
+                marker=dict(opacity=0.6, color=year_colours[str(year)]),
+                offsetgroup=str(year),
+                legendgroup=str(year)
+            )
+        )
+
+        if medians is not None:
+            year_medians = medians[medians["year"] == year]
+            fig3.add_trace(
+                go.Scatter(
+                    x=year_medians["month"],
+                    y=year_medians["median"],
+                    mode="markers",
+                    name=f"{year} median (95% interval)",
+                    marker=dict(symbol="line-ew-open", size=14, color="black"),
+                    error_y=dict(
+                        type="data",
+                        array=year_medians["upper"] - year_medians["median"],
+                        arrayminus=year_medians["median"] - year_medians["lower"],
+                        color="black"
+                    ),
+                    offsetgroup=str(year),
+                    legendgroup=str(year),
+                    showlegend=False
+                )
+            )
+
+    chart_title3 = (
+        f"Sales distribution by month{' (fast preview)' if medians is not None else ''}<br>"
+        f"operator: {operator} | region(s): {region_label} | station(s): {station_label}"
+    )
+
+    fig3.update_layout(
+        width=1200,
+        height=700,
+        title=dict(
+            text=chart_title3,
+            x=0.5,
+            xanchor="center",
+            yanchor="top"
+        ),
+        title_font=dict(size=20),
+        xaxis_title="month",
+        yaxis_title="sales gbp",
+        template="plotly_white",
+        showlegend=True,
+        xaxis=dict(
+            tickmode="array",
+            tickvals=list(range(1, 13)),
+            ticktext=[str(m) for m in range(1, 13)],
+            categoryorder="array",
+            categoryarray=list(range(1, 13))
+        ),
+        boxmode="group",
+        scattermode="group"
+    )
+
+    return fig3
+
+
+def weekday_share_figure(weekday_sales, operator, region_label, station_label):
+    """Percentage of each month's sales by weekday, from the weekday_share aggregate."""
+    agg = weekday_sales.copy()
+
+    # Converting to percentages within each month
+    agg["pct"] = agg.groupby("month")["sales"].transform(lambda x: x / x.sum() * 100)
+
+    fig = go.Figure()
+    for wd in WEEKDAY_ORDER:
+        wd_data = agg[agg["week_day"] == wd]
+        fig.add_trace(
+            go.Bar(
+                x=wd_data["month"],
+                y=wd_data["pct"],
+                name=wd.capitalize(),  # capitalize for nicer legend labels
+                text=wd_data["pct"].round(1).astype(str) + "%",
+                textposition="inside"
+            )
+        )
+
+    #  Chart title
+    chart_title = (
+        f"Sales distribution by weekday percentages per month<br>"
+        f"operator: {operator} | region(s): {region_label} | station(s): {station_label}"
+    )
+
+    fig.update_layout(
+        barmode="stack",
+        width=1200,
+        height=700,
+        title=dict(
+            text=chart_title,
+            x=0.5,
+            xanchor="center",
+            yanchor="top"
+        ),
+        title_font=dict(size=20),
+        xaxis=dict(
+            tickmode="array",
+            tickvals=list(range(1, 13)),
+            ticktext=[str(m) for m in range(1, 13)],
+            title="month"
+        ),
+        yaxis=dict(title="Sales (%)"),
+        template="plotly_white"
+    )
+
+    return fig
+
+
+def weekly_change_figure(weekly_sales, latest_year, previous_year, operator, region_label, station_label):
+    """Percentage change in sales by week of latest_year against previous_year.
+
+    Built from the weekly_change aggregate; weeks with no sales in previous_year show 0%.
+    """
+    # Pivoting by year
+    pivot = weekly_sales.pivot(index="week_number", columns="year", values="sales")
+
+    # Ensuring all weeks 1–52 are present, and both years even where a selection has no sales in one
+    years = [year for year in (previous_year, latest_year) if year is not None]
+    pivot = pivot.reindex(index=range(1, 53), columns=years, fill_value=0)
+
+    # Calculating percentage change of the latest year against the previous one.
+    # Avoiding division by zero by replacing 0 with NaN, then filling with 0
+    if previous_year is not None:
+        pivot["pct_change"] = (
+            (pivot[latest_year] - pivot[previous_year]) / pivot[previous_year].replace(0, pd.NA) * 100
+        )
+        pivot["pct_change"] = pivot["pct_change"].fillna(0)
+    else:
+        pivot["pct_change"] = 0.0
+
+    # Building bar chart.
+    fig = go.Figure()
+    fig.add_trace(
+        go.Bar(
+            x=pivot.index,
+            y=pivot["pct_change"],
+            text=pivot["pct_change"].round(1).astype(str) + "%",
+            textposition="outside",
+            marker=dict(color="#00a88f")
+        )
+    )
+
+    chart_title = (
+        f"Change in sales by week % ({latest_year} vs {previous_year})<br>"
+        f"operator: {operator} | region(s): {region_label} | station(s): {station_label}"
+    )
+
+    fig.update_layout(
+        width=1200,
+        height=700,
+        title=dict(
+            text=chart_title,
+            x=0.5,
+            xanchor="center",
+            yanchor="top"
+        ),
+        title_font=dict(size=20),
+        xaxis=dict(
+            tickmode="array",
+            tickvals=list(range(1, 53)),
+            ticktext=[str(w) for w in range(1, 53)],
+            title="week"
+        ),
+        yaxis=dict(title = 'sales change %'),
+        template="plotly_white",
+        shapes=[  # add a horizontal line at 0%
+            dict(
+                type="line",
+                xref="paper", x0=0, x1=1,
+                yref="y", y0=0, y1=0,
+                line=dict(color="black", dash="dash")
+            )
+        ]
+    )
+
+    return fig
+
+
+def coastal_figure(coastal_sales, year_colours, operator, region_label, station_label):
+    """Percentage of weekly sales from coastal stations, from the coastal aggregate."""
+    weekly_total = (
+        coastal_sales.groupby(['year','week_number'])['sales'].sum().reset_index(name='total_sales')
+    )
+
+    weekly_coastal = (
+        coastal_sales[coastal_sales['coastal_flag'] == 1]
+        .groupby(['year','week_number'])['sales']
+        .sum()
+        .reset_index(name='coastal_sales')
+    )
+
+    weekly_sales = pd.merge(weekly_total, weekly_coastal, on=['year','week_number'])
+    weekly_sales['coastal_pct'] = (weekly_sales['coastal_sales'] / weekly_sales['total_sales']) * 100
+    weekly_sales['year'] = weekly_sales['year'].astype(str)
+
+    fig_coastal = px.line(
+        weekly_sales,
+        x='week_number',
+        y='coastal_pct',
+        color='year',
+        markers=True,
+        labels={
+            'week_number': 'week',
+            'coastal_pct': 'coastal sales %',
+            'year': 'Year'
+        },
+        title=(
+            f"Sales from coastal stations by week<br>"
+            f"operator: {operator} | regions: {region_label} | stations: {station_label}"
+        ),
+        color_discrete_map=year_colours
+    )
+
+    fig_coastal.update_xaxes(tickmode='linear', tick0=1, dtick=1)
+    return fig_coastal
+
+
+def rurality_figure(rurality_sales, operator, region_label, station_label):
+    """Share of monthly sales by rurality, from the rurality aggregate."""
+    monthly_total = (
+        rurality_sales.groupby(['month'])['sales']
+        .sum()
+        .reset_index(name='total_sales')
+    )
+
+    monthly_rurality = rurality_sales.rename(columns={'sales': 'rurality_sales'})
+
+    # Merge totals with rurality breakdown
+    monthly_sales = pd.merge(monthly_total, monthly_rurality, on=['month'], how='inner')
+
+    # Calculate percentage share
+    monthly_sales['rurality_pct'] = (
+        monthly_sales['rurality_sales'] / monthly_sales['total_sales'] * 100
+    )
+
+    # --- Plot ---
+    fig_rurality = px.bar(
+        monthly_sales,
+        x="month",
+        y="rurality_pct",
+        color="rurality_nm",
+        barmode="stack",
+        labels={
+            "month": "Month",
+            "rurality_pct": "Sales share %",
+            "rurality_nm": "Rurality"
+        },
+        title=(
+            f"Sales share by rurality and month<br>"
+            f"operator: {operator} | regions: {region_label} | stations: {station_label}"
+        ),
+        color_discrete_sequence=px.colors.qualitative.Set2
+    )
+
+    fig_rurality.update_layout(
+        barmode="stack",
+        xaxis=dict(
+            tickmode="linear",
+            tick0=1,
+            dtick=1,
+            title="Month"
+        ),
+        yaxis=dict(title="Sales share %")
+    )
+
+    return fig_rurality
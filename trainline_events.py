@@ -0,0 +1,165 @@
+"""Event calendar of bank holidays and train strikes, and flagging sales rows against it.
+
+Events are held as sorted, non-overlapping day intervals [start, end), so flagging a row is a
+binary search of its date against the interval starts rather than a merge.
+"""
+
+#################################
+# LIBRARIES
+#################################
+
+import json
+
+import numpy as np
+import pandas as pd
+
+
+
+#################################
+# SETTINGS
+#################################
+
+HOLIDAYS_PATH = "lookups/lookup_holidays.json"
+STRIKES_PATH = "lookups/lookup_strikes.json"
+
+# Holiday calendars observed per region; regions not listed observe england-and-wales only.
+# Scotland is flagged for both, as in the original holiday merge.
+REGION_HOLIDAYS = {
+    'scotland': ['scotland', 'england-and-wales'],
+}
+DEFAULT_HOLIDAYS = ['england-and-wales']
+
+
+
+#################################
+# INTERVALS
+#################################
+
+def to_intervals(days):
+    """Sorted [start, end) intervals covering the given days, with consecutive days merged."""
+    days = np.unique(np.asarray(days, dtype='datetime64[D]'))
+    if len(days) == 0:
+        empty = np.array([], dtype='datetime64[D]')
+        return empty, empty
+    breaks = np.flatnonzero(np.diff(days) != np.timedelta64(1, 'D')) + 1
+    starts = days[np.r_[0, breaks]]
+    ends = days[np.r_[breaks - 1, len(days) - 1]] + np.timedelta64(1, 'D')
+    return starts, ends
+
+
+def union_intervals(*intervals):
+    """Intervals covering any of the given intervals."""
+    days = [
+        np.arange(start, end, dtype='datetime64[D]')
+        for starts, ends in intervals
+        for start, end in zip(starts, ends)
+    ]
+    return to_intervals(np.concatenate(days) if days else [])
+
+
+def in_intervals(days, intervals):
+    """Boolean array of whether each day falls in one of the intervals."""
+    starts, ends = intervals
+    days = np.asarray(days, dtype='datetime64[D]')
+    if len(starts) == 0:
+        return np.zeros(len(days), dtype=bool)
+    idx = np.searchsorted(starts, days, side='right') - 1
+    return (idx >= 0) & (days < ends[np.clip(idx, 0, None)])
+
+
+
+#################################
+# CALENDAR
+#################################
+
+def load_event_calendar(holidays_path=HOLIDAYS_PATH, strikes_path=STRIKES_PATH):
+    """Bank holiday intervals per holiday region and strike intervals per union.
+
+    Returns {'holiday': {region: intervals}, 'strike': {union: intervals}}. Strike dates called by
+    more than one union (e.g. "RMT + ASLEF") count towards each of them.
+    """
+    with open(holidays_path, encoding='utf-8') as f:
+        data_holidays = json.load(f)
+    with open(strikes_path, encoding='utf-8') as f:
+        data_strikes = json.load(f)
+
+    holidays = {
+        region: to_intervals([holiday['date'] for holidays in years.values() for holiday in holidays])
+        for region, years in data_holidays.items()
+    }
+
+    strike_days = {}
+    for entry in data_strikes['train_strikes']:
+        for d in entry['dates']:
+            for union in d['union'].split('+'):
+                strike_days.setdefault(union.strip(), []).append(d['date'])
+    strikes = {union: to_intervals(days) for union, days in strike_days.items()}
+
+    return {'holiday': holidays, 'strike': strikes}
+
+
+def holiday_intervals(calendar, region):
+    """Bank holiday intervals observed in a sales region."""
+    return union_intervals(*[
+        calendar['holiday'][name] for name in REGION_HOLIDAYS.get(region, DEFAULT_HOLIDAYS)
+        if name in calendar['holiday']
+    ])
+
+
+def strike_intervals(calendar):
+    """Intervals with a strike by any union."""
+    return union_intervals(*calendar['strike'].values())
+
+
+
+#################################
+# FLAGGING
+#################################
+
+def flag_events(df, calendar, date_col='date', region_col='region_nm'):
+    """Event flags for each row of df, indexed like df.
+
+    bank_holiday_flag follows the holiday calendars of the row's region; strike_flag, and a
+    strike_<union>_flag per union, apply to every region as the strike lookup has no region.
+    """
+    days = pd.to_datetime(df[date_col]).to_numpy().astype('datetime64[D]')
+    flags = pd.DataFrame(index=df.index)
+
+    # One search per holiday calendar combination, over the rows of the regions observing it
+    bank_holiday = np.zeros(len(df), dtype=bool)
+    regions = df[region_col]
+    for holiday_regions in {tuple(names) for names in REGION_HOLIDAYS.values()} | {tuple(DEFAULT_HOLIDAYS)}:
+        observing = [region for region in regions.unique()
+                     if tuple(REGION_HOLIDAYS.get(region, DEFAULT_HOLIDAYS)) == holiday_regions]
+        rows = regions.isin(observing).to_numpy()
+        intervals = union_intervals(*[calendar['holiday'][name] for name in holiday_regions
+                                      if name in calendar['holiday']])
+        bank_holiday[rows] = in_intervals(days[rows], intervals)
+    flags['bank_holiday_flag'] = bank_holiday.astype(int)
+
+    flags['strike_flag'] = in_intervals(days, strike_intervals(calendar)).astype(int)
+    for union, intervals in sorted(calendar['strike'].items()):
+        flags[f"strike_{union.lower()}_flag"] = in_intervals(days, intervals).astype(int)
+
+    return flags
+
+
+def event_periods(calendar, regions, start, end):
+    """Strike and bank holiday periods overlapping [start, end] in any of the regions.
+
+    Returns a DataFrame with columns event, start and end (exclusive), for shading charts.
+    """
+    periods = [
+        ('strike', strike_intervals(calendar)),
+        ('bank holiday', union_intervals(*[holiday_intervals(calendar, region) for region in set(regions)])),
+    ]
+    start, end = np.datetime64(pd.Timestamp(start).date()), np.datetime64(pd.Timestamp(end).date())
+
+    rows = []
+    for event, (starts, ends) in periods:
+        overlapping = (starts <= end) & (ends > start)
+        rows.extend(zip([event] * overlapping.sum(), starts[overlapping], ends[overlapping]))
+    return (
+        pd.DataFrame(rows, columns=['event', 'start', 'end'])
+        .sort_values('start', ignore_index=True)
+    )
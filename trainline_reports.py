@@ -0,0 +1,304 @@
+"""Batch export of the dashboard's charts for many filter combinations.
+
+Renders the network figures once, then every filtered figure for each combination, in parallel
+across processes. By default the combinations are the whole network, each region, each operator
+and each operator's regions; an explicit list can be given instead, down to sets of regions and
+stations. Chart totals are summed once per operator and region; combinations of whole regions are
+then built from those cells, so an operator's totals are reused for its regions and the regions'
+for the network rather than rescanning rows. Combinations naming stations are summed from their
+stations' rows.
+
+A combination is written operator[:region+region[:station+station]], with 'all' or an empty part
+for no filter, or listed in a json file as {"operator": ..., "regions": [...], "stations": [...]}.
+
+Usage:
+    python trainline_reports.py --out reports --formats html json
+    python trainline_reports.py --operator english_rail --start-year 2024 --formats png
+    python trainline_reports.py --combination "english_rail:london+wales" --combination "all::Leeds+York"
+    python trainline_reports.py --combinations weekly_reports.json
+"""
+
+#################################
+# LIBRARIES
+#################################
+
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import trainline_charts as charts
+import trainline_events as events
+
+
+
+#################################
+# SETTINGS
+#################################
+
+ALL_OPERATORS = 'all operators'
+ALL_REGIONS = 'all regions'
+ALL_STATIONS = 'all stations'
+
+# Each combination of whole regions is summed from cells of one operator in one region
+CELL = ['operator', 'region_nm']
+
+# Columns the distribution box plot draws from rows rather than totals
+DISTRIBUTION_COLUMNS = ['year', 'month', 'sales', 'station']
+
+FORMATS = ['html', 'json', 'png']
+
+
+
+#################################
+# COMBINATIONS
+#################################
+
+# A combination is (operator, regions, stations), with regions and stations tuples or None for all
+
+def _names(text):
+    """Names joined by '+', or None for all."""
+    text = text.strip()
+    if text in ('', 'all'):
+        return None
+    return tuple(name.strip() for name in text.split('+'))
+
+
+def parse_combination(text):
+    """Combination from operator[:region+region[:station+station]]."""
+    parts = text.split(':')
+    if len(parts) > 3:
+        raise argparse.ArgumentTypeError(f"expected operator[:regions[:stations]], got {text!r}")
+    operator, regions, stations = (parts + ['', ''])[:3]
+    operator = operator.strip()
+    return (
+        ALL_OPERATORS if operator in ('', 'all') else operator,
+        _names(regions),
+        _names(stations),
+    )
+
+
+def read_combinations(path):
+    """Combinations from a json list of {"operator", "regions", "stations"}, each optional."""
+    with open(path, encoding='utf-8') as f:
+        entries = json.load(f)
+    return [
+        (
+            entry.get('operator') or ALL_OPERATORS,
+            tuple(entry['regions']) if entry.get('regions') else None,
+            tuple(entry['stations']) if entry.get('stations') else None,
+        )
+        for entry in entries
+    ]
+
+
+def report_combinations(cells, operators=None):
+    """The default grid: the whole network, each region, each operator and each operator's regions.
+
+    The whole network and each region across all operators are included unless operators limits
+    the report to particular operators.
+    """
+    combinations = []
+    if not operators:
+        combinations.append((ALL_OPERATORS, None, None))
+        combinations.extend(
+            (ALL_OPERATORS, (region,), None) for region in sorted({region for _, region in cells})
+        )
+    for operator in sorted({operator for operator, _ in cells}):
+        if operators and operator not in operators:
+            continue
+        combinations.append((operator, None, None))
+        combinations.extend((operator, (region,), None) for op, region in sorted(cells) if op == operator)
+    return combinations
+
+
+def cells_for(cells, operator, regions):
+    """Cell keys making up a combination's operator and regions."""
+    return [
+        key for key in cells
+        if operator in (ALL_OPERATORS, key[0]) and (regions is None or key[1] in regions)
+    ]
+
+
+
+#################################
+# AGGREGATION
+#################################
+
+def cell_inputs(df):
+    """Each chart's totals and the distribution rows per operator and region."""
+    cells = {}
+    for name in charts.AGGREGATES:
+        partial = charts.aggregate(df, name, by=CELL)
+        for key, totals in partial.groupby(CELL):
+            cells.setdefault(key, {})[name] = totals.drop(columns=CELL)
+    for key, rows in df[CELL + DISTRIBUTION_COLUMNS].groupby(CELL):
+        cells[key]['rows'] = rows.drop(columns=CELL)
+    return cells
+
+
+def combine(cells, keys):
+    """Inputs for a combination of cells, with totals summed from the cells' totals."""
+    inputs = {
+        name: charts.aggregate(pd.concat([cells[key][name] for key in keys]), name)
+        for name in charts.AGGREGATES
+    }
+    inputs['rows'] = pd.concat([cells[key]['rows'] for key in keys], ignore_index=True)
+    return inputs
+
+
+def station_inputs(df, keys, stations):
+    """Inputs for the given stations within a combination's cells, summed from their rows."""
+    in_cells = pd.MultiIndex.from_frame(df[CELL]).isin(keys)
+    rows = df[in_cells & df['station'].isin(stations).to_numpy()]
+    inputs = {name: charts.aggregate(rows, name) for name in charts.AGGREGATES}
+    inputs['rows'] = rows[DISTRIBUTION_COLUMNS].reset_index(drop=True)
+    return inputs
+
+
+
+#################################
+# EXPORT
+#################################
+
+def write_figures(figures, directory, formats):
+    """Write each figure to directory once per format, named after its key in figures."""
+    os.makedirs(directory, exist_ok=True)
+    for name, fig in figures.items():
+        path = os.path.join(directory, name)
+        if 'html' in formats:
+            fig.write_html(path + '.html', include_plotlyjs='cdn')
+        if 'json' in formats:
+            fig.write_json(path + '.json')
+        if 'png' in formats:
+            fig.write_image(path + '.png')
+
+
+def combination_directory(out_dir, operator, regions, stations):
+    """out_dir/operator/regions[/stations], with names joined by '+' and spaces as underscores."""
+    parts = [operator, '+'.join(regions) if regions else ALL_REGIONS]
+    if stations:
+        parts.append('+'.join(stations))
+    return os.path.join(out_dir, *[part.replace(' ', '_') for part in parts])
+
+
+def render_combination(job):
+    """Build and write every filtered figure for one combination; runs in a worker process."""
+    labels, inputs, event_periods, years, year_colours, directory, formats = job
+    latest_year = years[-1]
+    previous_year = years[-2] if len(years) > 1 else None
+
+    figures = {
+        'sales_by_day': charts.sales_by_day_figure(inputs['sales_by_day'], year_colours, *labels),
+        'sales_over_time': charts.sales_over_time_figure(inputs['sales_over_time'], *labels, events=event_periods),
+        'distribution': charts.distribution_figure(inputs['rows'], years, year_colours, *labels),
+        'weekday_share': charts.weekday_share_figure(inputs['weekday_share'], *labels),
+        'coastal': charts.coastal_figure(inputs['coastal'], year_colours, *labels),
+        'rurality': charts.rurality_figure(inputs['rurality'], *labels),
+    }
+    if previous_year is not None:
+        figures['weekly_change'] = charts.weekly_change_figure(
+            inputs['weekly_change'], latest_year, previous_year, *labels
+        )
+
+    write_figures(figures, directory, formats)
+    return directory
+
+
+def export_reports(sales_path, stations_path, out_dir, formats, start_year=None, end_year=None,
+                   operators=None, combinations=None, workers=None):
+    """Export the network figures and every combination's filtered figures under out_dir.
+
+    combinations is a list of (operator, regions, stations), defaulting to the grid from
+    report_combinations. Combinations with no sales in the years loaded are skipped.
+    """
+    available_years = charts.read_years(sales_path)
+    df = charts.read_sales(
+        start_year or available_years[0], end_year or available_years[-1], path=sales_path
+    )
+    df_stations = pd.read_csv(stations_path)
+    years = sorted(df['year'].unique().tolist())
+    year_colours = charts.year_colour_map(available_years)
+
+    # Network figures don't depend on the filters, so are only written once
+    station_pct = df['station'].nunique() / df_stations['station'].nunique() * 100
+    write_figures(
+        {
+            'map': charts.map_figure(df),
+            'operator_share': charts.operator_share_figure(df, years),
+            'coverage': charts.coverage_gauge_figure(station_pct),
+        },
+        os.path.join(out_dir, 'network'),
+        formats
+    )
+
+    cells = cell_inputs(df)
+    calendar = events.load_event_calendar()
+    jobs = []
+    for operator, regions, stations in combinations or report_combinations(cells, operators):
+        region_label = ', '.join(regions) if regions else ALL_REGIONS
+        station_label = ', '.join(stations) if stations else ALL_STATIONS
+        keys = cells_for(cells, operator, regions)
+        inputs = station_inputs(df, keys, stations) if keys and stations else combine(cells, keys) if keys else None
+        if inputs is None or inputs['rows'].empty:
+            print(f"skipping {operator} / {region_label} / {station_label}: no sales")
+            continue
+
+        event_periods = events.event_periods(calendar, [key[1] for key in keys], df['date'].min(), df['date'].max())
+        jobs.append((
+            (operator, region_label, station_label), inputs, event_periods, years, year_colours,
+            combination_directory(out_dir, operator, regions, stations), formats
+        ))
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(render_combination, jobs))
+
+
+
+#################################
+# CLI
+#################################
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export the dashboard's charts for many filter combinations.")
+    parser.add_argument('--sales', default=charts.SALES_PATH, help='processed sales directory of per-year files, or a single csv')
+    parser.add_argument('--stations', default='stations.csv', help='stations csv, for coverage')
+    parser.add_argument('--out', default='reports', help='directory to write the reports to')
+    parser.add_argument('--formats', nargs='+', choices=FORMATS, default=['html'],
+                        help='formats to write each figure in; png needs kaleido installed')
+    parser.add_argument('--start-year', type=int, help='first year to include (default: earliest)')
+    parser.add_argument('--end-year', type=int, help='last year to include (default: latest)')
+    parser.add_argument('--operator', action='append', dest='operators',
+                        help='only report on this operator and its regions; may be repeated')
+    parser.add_argument('--combination', action='append', dest='combinations', type=parse_combination,
+                        help="report on operator[:region+region[:station+station]], 'all' or empty "
+                             "for no filter, instead of the grid; may be repeated")
+    parser.add_argument('--combinations', dest='combinations_file',
+                        help='json list of {"operator", "regions", "stations"} to report on instead of the grid')
+    parser.add_argument('--workers', type=int, help='processes to render with (default: one per cpu)')
+    args = parser.parse_args(argv)
+
+    if 'png' in args.formats:
+        try:
+            import kaleido  # noqa: F401
+        except ImportError:
+            parser.error('png export needs kaleido; pip install kaleido')
+
+    combinations = args.combinations or []
+    if args.combinations_file:
+        combinations += read_combinations(args.combinations_file)
+    if combinations and args.operators:
+        parser.error('--operator limits the default grid, so can\'t be used with --combination(s)')
+
+    directories = export_reports(
+        args.sales, args.stations, args.out, args.formats,
+        start_year=args.start_year, end_year=args.end_year,
+        operators=args.operators, combinations=combinations or None, workers=args.workers
+    )
+    print(f"wrote {len(directories)} reports to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""Data-quality validation for the station lookup and sales on ingest.
+
+Each check is a vectorised mask over the whole frame, so validation stays linear in the rows
+loaded and can run on every incremental load. Bad rows are quarantined with the first reason they
+failed; every check is summarised in a compact report, with quarantined rows counted against that
+first reason so the counts add up to the rows quarantined.
+"""
+
+#################################
+# LIBRARIES
+#################################
+
+import numpy as np
+import pandas as pd
+
+
+
+#################################
+# SETTINGS
+#################################
+
+# Robust z-score (distance from the station's median in scaled MADs) above which sales are flagged
+OUTLIER_Z = 5
+
+# Scales the median absolute deviation to a standard deviation for normally distributed sales
+MAD_SCALE = 1.4826
+
+# Report columns
+REPORT_COLUMNS = ['check', 'rows', 'action', 'examples']
+
+
+
+#################################
+# REPORTING
+#################################
+
+def _report_row(check, mask, action, examples):
+    """One line of the report, with up to three distinct examples of what failed."""
+    return {
+        'check': check,
+        'rows': int(mask.sum()),
+        'action': action,
+        'examples': ', '.join(map(str, pd.unique(examples[mask])[:3])),
+    }
+
+
+def _first_failures(checks):
+    """(check, mask) pairs with each mask limited to rows that passed the checks before it."""
+    first, failed = [], None
+    for check, mask in checks:
+        first.append((check, mask if failed is None else mask & ~failed))
+        failed = mask if failed is None else failed | mask
+    return first
+
+
+def _quarantine(df, checks):
+    """Split df into clean and quarantined rows, given (check, mask) pairs in order of precedence.
+
+    Quarantined rows get a reason column naming the first check they failed.
+    """
+    masks = [mask for _, mask in checks]
+    bad = np.logical_or.reduce(masks) if masks else np.zeros(len(df), dtype=bool)
+    reason = np.select(masks, [check for check, _ in checks], default='')
+    return df[~bad], df[bad].assign(reason=reason[bad])
+
+
+def _quarantine_report(checks, examples):
+    """Report rows for each check's first failures, and the total quarantined."""
+    first = _first_failures(checks)
+    rows = [_report_row(check, mask, 'quarantined', examples) for check, mask in first]
+    bad = np.logical_or.reduce([mask for _, mask in first]) if first else np.zeros(len(examples), dtype=bool)
+    rows.append(_report_row('quarantined_total', bad, 'quarantined', examples))
+    return rows
+
+
+
+#################################
+# STATIONS
+#################################
+
+def validate_stations(df_stations, resolutions=None, key='station'):
+    """Check the station lookup for duplicate keys.
+
+    resolutions maps a duplicated station to the operator known to be correct for it; that row is
+    kept and the others quarantined. Stations duplicated without a resolution are quarantined
+    entirely, so their sales show up as unmatched rather than being matched to a guess.
+
+    Returns (clean, quarantined, report).
+    """
+    resolutions = resolutions or {}
+    duplicated = df_stations.duplicated(subset=[key], keep=False).to_numpy()
+    preferred = df_stations[key].map(resolutions)
+    resolved = duplicated & preferred.notna().to_numpy()
+    superseded = resolved & (df_stations['operator'] != preferred).to_numpy()
+    unresolved = duplicated & ~resolved
+
+    checks = [
+        ('duplicate_station_superseded', superseded),
+        ('duplicate_station_unresolved', unresolved),
+    ]
+    clean, quarantined = _quarantine(df_stations, checks)
+    report = pd.DataFrame(_quarantine_report(checks, df_stations[key]), columns=REPORT_COLUMNS)
+    return clean, quarantined, report
+
+
+
+#################################
+# SALES
+#################################
+
+def validate_sales(df_sales, existing=None, matched_col='operator', outlier_z=OUTLIER_Z):
+    """Check enriched sales rows, i.e. after the merge with the station lookup.
+
+    Quarantines rows with a missing or blank date, station or sales; repeats of a (station, date)
+    already seen in this load or in existing; negative sales; and stations left unmatched by the
+    enrichment merge (matched_col is null). Flags, but keeps, sales more than outlier_z robust
+    z-scores from their station's median in an outlier_flag column, and reports dates missing per
+    station against the dates present in the load.
+
+    A station's median and spread are taken from its sales in existing as well as in the load, so
+    incremental loads of a few rows per station are judged against the station's history. Without
+    existing they come from the load alone.
+
+    Each quarantined row is reported against the first check it failed, in the order above.
+
+    Returns (clean, quarantined, report).
+    """
+    station = df_sales['station']
+    dates = pd.to_datetime(df_sales['date'], errors='coerce')
+    sales = pd.to_numeric(df_sales['sales'], errors='coerce')
+
+    missing = (
+        dates.isna() | sales.isna() | station.isna()
+        | station.astype(str).str.strip().eq('')
+    ).to_numpy()
+
+    keys = pd.MultiIndex.from_arrays([station, dates])
+    duplicate = keys.duplicated(keep='first')
+    if existing is not None:
+        existing_keys = pd.MultiIndex.from_arrays(
+            [existing['station'], pd.to_datetime(existing['date'], errors='coerce')]
+        )
+        duplicate |= keys.isin(existing_keys)
+
+    negative = (sales < 0).to_numpy()
+    unmatched = (df_sales[matched_col].isna() & station.notna()).to_numpy()
+
+    # Robust z-score per station against its history; stations with no spread can't have outliers
+    if existing is not None:
+        history = pd.concat([pd.to_numeric(existing['sales'], errors='coerce'), sales], ignore_index=True)
+        history_station = pd.concat([existing['station'], station], ignore_index=True)
+    else:
+        history, history_station = sales, station
+    median = history.groupby(history_station).median()
+    mad = (history - history_station.map(median)).abs().groupby(history_station).median() * MAD_SCALE
+    deviation = (sales - station.map(median)).abs()
+    outlier = (deviation / station.map(mad).replace(0, np.nan) > outlier_z).to_numpy()
+
+    # Dates in the load with no row for a station, among rows with a date and station
+    valid_dates = dates[~missing]
+    gaps = valid_dates.nunique() - valid_dates.groupby(station[~missing]).nunique()
+    gaps = gaps[gaps > 0].sort_values(ascending=False)
+
+    checks = [
+        ('missing', missing),
+        ('duplicate', duplicate),
+        ('negative_sales', negative),
+        ('unmatched_station', unmatched),
+    ]
+    clean, quarantined = _quarantine(df_sales.assign(outlier_flag=outlier.astype(int)), checks)
+    report = pd.DataFrame([
+        *_quarantine_report(checks, station),
+        _report_row('outlier_sales', outlier, 'flagged', station),
+        {
+            'check': 'date_gaps',
+            'rows': int(gaps.sum()),
+            'action': 'reported',
+            'examples': ', '.join(f"{name} ({count})" for name, count in gaps.head(3).items()),
+        },
+    ], columns=REPORT_COLUMNS)
+    return clean, quarantined, report